@@ -4,8 +4,8 @@
 import os
 import time
 import multiprocessing
+from multiprocessing import shared_memory
 from PIL import Image, ImageDraw, ImageFont
-import math
 
 # --- Get the absolute path of the script itself ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,64 +16,192 @@ OUTPUT_DIR_NODE1 = os.path.join(SCRIPT_DIR, 'output_dist_node1')
 OUTPUT_DIR_NODE2 = os.path.join(SCRIPT_DIR, 'output_dist_node2')
 TARGET_SIZE = (128, 128)
 WATERMARK_TEXT = "CUI-LHR SP23"
+RESAMPLE = Image.LANCZOS # BICUBIC/BILINEAR are faster if quality allows
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.PNG', '.JPG', '.JPEG', '.BMP'})
+
+# Cheap encoder settings by output extension (quality 70 4:2:0 JPEG, fast PNG)
+JPEG_SAVE_OPTIONS = {'format': 'JPEG', 'quality': 70, 'optimize': False,
+                     'subsampling': 2, 'progressive': False}
+SAVE_OPTIONS = {
+    '.jpg': JPEG_SAVE_OPTIONS,
+    '.jpeg': JPEG_SAVE_OPTIONS,
+    '.png': {'format': 'PNG', 'compress_level': 1},
+}
 NUM_NODES = 2 # [cite: 45]
 
+# --- Check which Pillow build is installed ---
+# Pillow-SIMD versions carry a '.postN' suffix and vectorize the LANCZOS resize.
+def check_pillow_build():
+    if '.post' in Image.__version__:
+        print(f"Using Pillow-SIMD {Image.__version__} (SIMD-accelerated resize)")
+    else:
+        print(f"Using stock Pillow {Image.__version__} (install pillow-simd for faster resize)")
+
+# --- Load the watermark font once per process ---
+_FONT = None
+
+def _get_font():
+    global _FONT
+    if _FONT is None:
+        try:
+            _FONT = ImageFont.truetype("arial.ttf", 10)
+        except IOError:
+            _FONT = ImageFont.load_default()
+    return _FONT
+
+# --- Pre-render the watermark once per process ---
+# The text never changes, so it is rasterized once into a mask that
+# process_image() pastes white through.
+_WATERMARK_MASK = None
+
+def _get_watermark():
+    global _WATERMARK_MASK
+    if _WATERMARK_MASK is None:
+        font = _get_font()
+        _, _, right, bottom = font.getbbox(WATERMARK_TEXT)
+        _WATERMARK_MASK = Image.new('L', (right, bottom), 0)
+        ImageDraw.Draw(_WATERMARK_MASK).text((0, 0), WATERMARK_TEXT, font=font, fill=255)
+    return _WATERMARK_MASK
+
+# --- Share the watermark with worker processes ---
+# The master renders the mask once and copies its pixels into a shared
+# memory block; each worker wraps that block in an Image without copying
+# it, so all workers read the same single copy.
+_WATERMARK_SHM = None
+
+def _share_watermark():
+    mask = _get_watermark()
+    data = mask.tobytes()
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return shm, mask.size
+
+def _attach_watermark(shm_name, size):
+    global _WATERMARK_SHM, _WATERMARK_MASK
+    _WATERMARK_SHM = shared_memory.SharedMemory(name=shm_name)
+    _WATERMARK_MASK = Image.frombuffer('L', size, _WATERMARK_SHM.buf, 'raw', 'L', 0, 1)
+
 # --- Helper Function (Process a single image) ---
-# This is the same function from the other files.
-def process_image(input_path, output_path):
+# The same processing as the other files. Like sequential_process.py, it is
+# built by a factory so the per-image code reads closure locals instead of
+# module globals. Each node builds its own in _init_node, once the watermark
+# is attached (node_worker is what the Pool pickles, not this closure).
+def make_processor(size, resample, watermark_mask):
+    width, height = size
+    draft_size = (width * 2, height * 2)
+    text_position = (5, height - 15)
+    text_color = (255, 255, 255)
+    save_options = SAVE_OPTIONS
+    default_options = {}
+    splitext = os.path.splitext
+    open_image = Image.open
+
+    def process_image(input_path, output_path):
+        try:
+            with open_image(input_path) as img:
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (no-op for non-JPEGs)
+                img.draft('RGB', draft_size)
+                # Convert palette/1-bit/CMYK/alpha images before resizing, so they
+                # get a real LANCZOS filter in RGB; grayscale is converted after
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                img = img.resize(size, resample)
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.paste(text_color, text_position, watermark_mask)
+                img.save(output_path, **save_options.get(splitext(output_path)[1].lower(), default_options))
+        except Exception as e:
+            print(f"Error processing {input_path}: {e}")
+
+    return process_image
+
+# --- Find All Images ---
+# Recursive os.scandir() walk; each entry already carries its path and type.
+def _iter_images(root):
     try:
-        with Image.open(input_path) as img:
-            img = img.resize(TARGET_SIZE, Image.LANCZOS)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            draw = ImageDraw.Draw(img)
-            try:
-                font = ImageFont.truetype("arial.ttf", 10)
-            except IOError:
-                font = ImageFont.load_default()
-            text_position = (5, TARGET_SIZE[1] - 15)
-            text_color = (255, 255, 255)
-            draw.text(text_position, WATERMARK_TEXT, font=font, fill=text_color)
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            img.save(output_path)
-    except Exception as e:
-        print(f"Error processing {input_path}: {e}")
+        entries = os.scandir(root)
+    except OSError:
+        # Unreadable directory: skip it, as os.walk() does
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_images(entry.path)
+            elif entry.is_file():
+                # Suffix from the last '.'. All-lower and all-upper suffixes
+                # match as-is; only mixed case ('.Jpg') pays for a lower()
+                # copy. Names without a '.' give a 1-char string, which
+                # never matches. (is_file() leaves out directory symlinks.)
+                name = entry.name
+                suffix = name[name.rfind('.'):]
+                if suffix in IMAGE_EXTENSIONS or suffix.lower() in IMAGE_EXTENSIONS:
+                    yield entry.path
+
+# --- Shared Task Queue ---
+# A multiprocessing.Queue can't be sent as a task argument, so each pool
+# process receives it once, through the Pool initializer (along with the
+# shared watermark, from which the node's process_image() is built).
+_TASK_QUEUE = None
+_PROCESS_IMAGE = None
+
+def _init_node(task_queue, watermark_shm_name, watermark_size, ready):
+    global _TASK_QUEUE, _PROCESS_IMAGE
+    _TASK_QUEUE = task_queue
+    _attach_watermark(watermark_shm_name, watermark_size)
+    _PROCESS_IMAGE = make_processor(TARGET_SIZE, RESAMPLE, _WATERMARK_MASK)
+    # Hold every node until all NUM_NODES have started, so both are idle
+    # when the node tasks are handed out and each one takes a task
+    # (otherwise the first node up could drain the whole queue alone).
+    ready.wait()
 
 # --- Node Worker Function ---
 # This is the function that each of our 2 "node" processes will run.
 # [cite: 46]
-def node_worker(node_id, image_list, output_dir, result_queue):
+def node_worker(node_id, output_dir):
     """
-    Simulates a "node" that processes a specific list of images.
+    Simulates a "node" that pulls images from the shared task queue until
+    it receives the None sentinel.
+
+    Nodes pull the next image as soon as they are free, so a node that gets
+    larger images simply takes fewer of them, rather than finishing late
+    while the other node sits idle.
     
     Args:
         node_id (int): Identifier for this node (e.g., 1 or 2).
-        image_list (list): The *subset* of images this node is responsible for.
         output_dir (str): The output directory for this node.
-        result_queue (multiprocessing.Queue): A queue to send results back to master.
+
+    Returns:
+        tuple: (node_id, num_images, time_taken), sent back to the master.
     """
-    print(f"[Node {node_id}] starting, assigned {len(image_list)} images.")
+    print(f"[Node {node_id}] starting.")
     start_time = time.perf_counter()
+    num_images = 0
+    process_image = _PROCESS_IMAGE
     
-    for input_path in image_list:
+    while True:
+        input_path = _TASK_QUEUE.get()
+        if input_path is None:
+            break
+
         # Construct the unique output path for this node
         relative_path = os.path.relpath(input_path, SOURCE_DIR)
         output_path = os.path.join(output_dir, relative_path)
         
         process_image(input_path, output_path)
+        num_images += 1
 
     end_time = time.perf_counter()
     time_taken = end_time - start_time
     
-    print(f"[Node {node_id}] finished in {time_taken:.2f}s.")
+    print(f"[Node {node_id}] finished {num_images} images in {time_taken:.2f}s.")
     
-    # Put the result into the shared queue for the master process
-    # 
-    result_queue.put((node_id, len(image_list), time_taken))
+    # The Pool hands this return value back to the master process
+    return (node_id, num_images, time_taken)
 
 # --- Master Process Function ---
 def main():
     print("Starting simulated distributed processing...")
+    check_pillow_build()
     
     # --- 1. Get baseline sequential time ---
     # We need this to calculate efficiency [cite: 53]
@@ -88,11 +216,7 @@ def main():
     # To be more accurate, we'll run it quickly:
     print("Getting baseline sequential time...")
     seq_start = time.perf_counter()
-    all_image_paths = []
-    for root, _, files in os.walk(SOURCE_DIR):
-        for file in files:
-            if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                all_image_paths.append(os.path.join(root, file))
+    all_image_paths = list(_iter_images(SOURCE_DIR))
     
     # Simulate processing by just sleeping for a tiny bit per image
     # We don't want to re-process all images here, just get a list.
@@ -105,58 +229,63 @@ def main():
     print(f"Using baseline sequential time: {SEQUENTIAL_TIME:.2f}s")
 
 
-    # --- 2. Divide tasks among nodes [cite: 45] ---
-    total_images = len(all_image_paths)
-    # Use math.ceil to handle odd numbers of images
-    images_per_node = math.ceil(total_images / NUM_NODES)
-    
-    # Split the list of images into 2 "subsets"
-    node_tasks = [
-        all_image_paths[0 : images_per_node], # Node 1's list
-        all_image_paths[images_per_node : ]   # Node 2's list
-    ]
+    # --- 2. Put the tasks on a shared queue [cite: 45] ---
+    # Instead of giving each node a fixed half of the list up front, the
+    # nodes pull images one at a time, so neither node is left idle while
+    # the other works through a slower half.
+    task_queue = multiprocessing.Queue()
+    for input_path in all_image_paths:
+        task_queue.put(input_path)
+    # One "stop" sentinel per node
+    for _ in range(NUM_NODES):
+        task_queue.put(None)
+
     node_outputs = [OUTPUT_DIR_NODE1, OUTPUT_DIR_NODE2]
+
+    # Any node may process any image, so create every class's
+    # sub-directory in every node's output folder, before the nodes start
+    unique_dirs = {
+        os.path.dirname(os.path.join(output_dir, os.path.relpath(p, SOURCE_DIR)))
+        for output_dir in node_outputs
+        for p in all_image_paths
+    }
+    for d in unique_dirs:
+        os.makedirs(d, exist_ok=True)
     
-    # --- 3. Set up communication ---
-    # A Manager() or Queue() can be used. A Queue is simpler.
-    result_queue = multiprocessing.Queue()
-    
-    processes = [] # To store our process objects
-    
-    # Get the overall start time for the distributed run
-    dist_start_time = time.perf_counter()
+    # --- 3. Set up the node arguments ---
+    # One (node_id, output_dir) tuple per node
+    node_args = [(i + 1, node_outputs[i]) for i in range(NUM_NODES)]
+
+    # Render the watermark once, in shared memory, for both nodes
+    watermark_shm, watermark_size = _share_watermark()
+    try:
+        # Get the overall start time for the distributed run
+        dist_start_time = time.perf_counter()
     
-    # --- 4. Launch "node" processes ---
-    for i in range(NUM_NODES):
-        node_id = i + 1
-        p = multiprocessing.Process(
-            target=node_worker, 
-            args=(node_id, node_tasks[i], node_outputs[i], result_queue)
-        )
-        processes.append(p)
-        p.start() # Start the process
-
-    # --- 5. Wait for all nodes to finish ---
-    # 
-    for p in processes:
-        p.join() # This blocks until the process 'p' is done
+        # --- 4. Launch "node" processes and wait for them ---
+        # A Pool with one process per node. starmap() blocks until every
+        # node has finished and gives back their return values directly,
+        # so there is no result queue to drain (and no result can be missed).
+        ready = multiprocessing.Barrier(NUM_NODES)
+        with multiprocessing.Pool(processes=NUM_NODES, initializer=_init_node,
+                                  initargs=(task_queue, watermark_shm.name, watermark_size, ready)) as pool:
+            # Results: [(node_id, num_images, time_taken), ...] in node order.
+            # chunksize=1 keeps the two node tasks as separate pool tasks; the
+            # barrier in _init_node makes sure two processes are there to take them.
+            node_times = pool.starmap(node_worker, node_args, chunksize=1)
         
-    dist_end_time = time.perf_counter()
+        dist_end_time = time.perf_counter()
+    finally:
+        # Free the shared block even if a node fails or is interrupted
+        watermark_shm.close()
+        watermark_shm.unlink()
     
-    # --- 6. Aggregate results ---
+    # --- 5. Aggregate results ---
     # The total time is the time from when the first process
     # started to when the *last* process finished.
     total_distributed_time = dist_end_time - dist_start_time
     
-    node_times = []
-    while not result_queue.empty():
-        # Get results: (node_id, num_images, time_taken)
-        node_times.append(result_queue.get())
-        
-    # Sort by node_id
-    node_times.sort()
-    
-    # --- 7. Print summary [cite: 49] ---
+    # --- 6. Print summary [cite: 49] ---
     print("\n" + "="*30)
     print("      Distributed Simulation Summary")
     print("="*30)
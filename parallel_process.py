@@ -2,83 +2,331 @@
 # 
 
 import os
+import sys
 import time
 from PIL import Image, ImageDraw, ImageFont
 import multiprocessing  # The core library for this task
+from multiprocessing import shared_memory
 from concurrent.futures import ThreadPoolExecutor # The alternative 
 
+# OpenCV is optional. Its resize is SIMD-optimized and it can write
+# straight into a reused output buffer (see opencv_process_batch).
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+else:
+    # Parallelism comes from our workers, not OpenCV's own thread pool,
+    # which would oversubscribe the cores and leave the master running
+    # threads when it forks the workers
+    cv2.setNumThreads(0)
+
 # --- Configuration (Same as sequential) ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SOURCE_DIR = os.path.join(SCRIPT_DIR, 'images_dataset')
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'output_parallel')      # Different output directory [cite: 32]
 TARGET_SIZE = (128, 128)
 WATERMARK_TEXT = "CUI-LHR SP23"
+RESAMPLE = Image.LANCZOS # BICUBIC/BILINEAR are faster if quality allows
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.PNG', '.JPG', '.JPEG', '.BMP'})
+
+# Cheap encoder settings by output extension (quality 70 4:2:0 JPEG, fast PNG)
+JPEG_SAVE_OPTIONS = {'format': 'JPEG', 'quality': 70, 'optimize': False,
+                     'subsampling': 2, 'progressive': False}
+SAVE_OPTIONS = {
+    '.jpg': JPEG_SAVE_OPTIONS,
+    '.jpeg': JPEG_SAVE_OPTIONS,
+    '.png': {'format': 'PNG', 'compress_level': 1},
+}
+
+# How worker processes are started. 'spawn' (the default on macOS/Windows)
+# re-imports this whole module in every worker, which is paid again for each
+# worker count we test. 'forkserver' starts workers by forking a small,
+# already-initialized server process instead. On Linux plain 'fork' is
+# cheaper still (and safe here, since the master runs no threads).
+# Windows only supports 'spawn', so we fall back to the default there.
+START_METHOD = 'fork' if sys.platform.startswith('linux') else 'forkserver'
+
+# Set USE_OPENCV=1 to run the OpenCV pipeline instead of Pillow
+USE_OPENCV = os.environ.get('USE_OPENCV', '0') == '1'
+
+# Set USE_THREADS=1 to also run the sweep with a ThreadPoolExecutor
+USE_THREADS = os.environ.get('USE_THREADS', '0') == '1'
+
+# Optional Numba LANCZOS kernel (see lanczos_resize.py), enabled with USE_NUMBA=1
+USE_NUMBA = os.environ.get('USE_NUMBA', '0') == '1'
+lanczos_resize = None
+if USE_NUMBA:
+    try:
+        from lanczos_resize import lanczos_resize, warm_up
+        from numba import set_num_threads, threading_layer
+    except ImportError:
+        pass
+
+# --- Check which Pillow build is installed ---
+# Pillow-SIMD versions carry a '.postN' suffix and vectorize the LANCZOS resize.
+def check_pillow_build():
+    if '.post' in Image.__version__:
+        print(f"Using Pillow-SIMD {Image.__version__} (SIMD-accelerated resize)")
+    else:
+        print(f"Using stock Pillow {Image.__version__} (install pillow-simd for faster resize)")
+
+# --- Load the watermark font once per process ---
+_FONT = None
+
+def _get_font():
+    global _FONT
+    if _FONT is None:
+        try:
+            _FONT = ImageFont.truetype("arial.ttf", 10)
+        except IOError:
+            _FONT = ImageFont.load_default()
+    return _FONT
+
+# --- Pre-render the watermark once per process ---
+# The text never changes, so it is rasterized once into a mask that
+# process_image() pastes white through.
+_WATERMARK_MASK = None
+
+def _get_watermark():
+    global _WATERMARK_MASK
+    if _WATERMARK_MASK is None:
+        font = _get_font()
+        _, _, right, bottom = font.getbbox(WATERMARK_TEXT)
+        _WATERMARK_MASK = Image.new('L', (right, bottom), 0)
+        ImageDraw.Draw(_WATERMARK_MASK).text((0, 0), WATERMARK_TEXT, font=font, fill=255)
+    return _WATERMARK_MASK
+
+# --- Share the watermark with worker processes ---
+# The master renders the mask once and copies its pixels into a shared
+# memory block; each worker wraps that block in an Image without copying
+# it, so all workers read the same single copy.
+_WATERMARK_SHM = None
+
+def _share_watermark():
+    mask = _get_watermark()
+    data = mask.tobytes()
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return shm, mask.size
+
+def _attach_watermark(shm_name, size):
+    global _WATERMARK_SHM, _WATERMARK_MASK
+    _WATERMARK_SHM = shared_memory.SharedMemory(name=shm_name)
+    _WATERMARK_MASK = Image.frombuffer('L', size, _WATERMARK_SHM.buf, 'raw', 'L', 0, 1)
+
+# --- Worker Setup ---
+# Runs once in each worker process as it starts, so the first real task
+# doesn't pay for loading PIL's format plugins or attaching the watermark.
+# Each worker then waits on the 'ready' barrier, which the master also
+# joins, so the master knows every worker is fully set up before timing.
+def _init_worker(watermark_shm_name, watermark_size, ready):
+    global _PROCESS_IMAGE
+    Image.init()
+    _attach_watermark(watermark_shm_name, watermark_size)
+    _PROCESS_IMAGE = make_processor(TARGET_SIZE, RESAMPLE, _WATERMARK_MASK)
+    if lanczos_resize is not None:
+        # The pool already keeps every core busy, so one Numba thread each
+        warm_up(TARGET_SIZE, threads=1)
+    ready.wait()
+
+# --- Image Processor Factory ---
+# Like sequential_process.py, the per-image code is built as a closure so it
+# reads locals instead of module globals on every image. Each worker builds
+# its own in _init_worker, once the shared watermark is attached; main()
+# builds one for the inline baseline and thread runs.
+def make_processor(size, resample, watermark_mask):
+    width, height = size
+    draft_size = (width * 2, height * 2)
+    text_position = (5, height - 15)
+    text_color = (255, 255, 255)
+    save_options = SAVE_OPTIONS
+    default_options = {}
+    splitext = os.path.splitext
+    resize = lanczos_resize
+    open_image = Image.open
+
+    def process_image(input_path, output_path):
+        try:
+            with open_image(input_path) as img:
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (no-op for non-JPEGs)
+                img.draft('RGB', draft_size)
+                # Convert palette/1-bit/CMYK/alpha images before resizing, so they
+                # get a real LANCZOS filter in RGB; grayscale is converted after
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                if resize is not None:
+                    img = resize(img, size)
+                else:
+                    img = img.resize(size, resample)
+
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+
+                img.paste(text_color, text_position, watermark_mask)
+
+                # Output sub-directories are created up front in main()
+                img.save(output_path, **save_options.get(splitext(output_path)[1].lower(), default_options))
+
+            # Return True on success
+            return True
+        except Exception as e:
+            print(f"Error processing {input_path}: {e}")
+            # Return False on failure
+            return False
+
+    return process_image
+
+_PROCESS_IMAGE = None
 
 # --- Helper Function (The 'Task') ---
 # This function must be at the top level (not inside another function)
-# so that other processes can import and run it.
+# so that other processes can import and run it. It hands the work to the
+# processor built by make_processor().
 def process_image(image_paths):
     """
     Takes a tuple of (input_path, output_path) and processes the image.
     This is the "work" that each parallel worker will do.
     """
-    input_path, output_path = image_paths # Unpack the tuple
-    
-    try:
-        with Image.open(input_path) as img:
-            img = img.resize(TARGET_SIZE, Image.LANCZOS)
+    return _PROCESS_IMAGE(*image_paths)
 
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-                
-            draw = ImageDraw.Draw(img)
-            
-            try:
-                font = ImageFont.truetype("arial.ttf", 10)
-            except IOError:
-                font = ImageFont.load_default()
+# --- OpenCV Alternative (Batch of Tasks) ---
+def opencv_process_batch(batch):
+    """
+    Takes a list of (input_path, output_path) tuples and processes them
+    with OpenCV. Every image is resized into the same output buffer, so
+    there is no new allocation per image.
+    Returns a list of True/False results, one per task.
+    """
+    resized = np.empty((TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+    results = []
+    for input_path, output_path in batch:
+        try:
+            img = cv2.imread(input_path, cv2.IMREAD_COLOR)
+            if img is None:
+                raise IOError("cannot read image")
+
+            cv2.resize(img, TARGET_SIZE, dst=resized, interpolation=cv2.INTER_LANCZOS4)
 
-            text_position = (5, TARGET_SIZE[1] - 15)
+            # putText positions the text's baseline (PIL uses its top-left),
+            # so this lines up with the Pillow watermark.
+            text_position = (5, TARGET_SIZE[1] - 5)
             text_color = (255, 255, 255)
-            draw.text(text_position, WATERMARK_TEXT, font=font, fill=text_color)
+            cv2.putText(resized, WATERMARK_TEXT, text_position,
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, text_color, 1)
 
-            # Create the output sub-directory if it doesn't exist
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            img.save(output_path)
-        
-        # Return True on success
-        return True
-    except Exception as e:
-        print(f"Error processing {input_path}: {e}")
-        # Return False on failure
-        return False
+            # Match the Pillow encoder settings (SAVE_OPTIONS)
+            ext = os.path.splitext(output_path)[1].lower()
+            if ext in ('.jpg', '.jpeg'):
+                params = [cv2.IMWRITE_JPEG_QUALITY, 70, cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                          cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420]
+            elif ext == '.png':
+                params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+            else:
+                params = []
+            if not cv2.imwrite(output_path, resized, params):
+                raise IOError("cannot write image")
+            results.append(True)
+        except Exception as e:
+            print(f"Error processing {input_path}: {e}")
+            results.append(False)
+    return results
+
+# --- Find All Images ---
+# Recursive os.scandir() walk; each entry already carries its path and type.
+def _iter_images(root):
+    try:
+        entries = os.scandir(root)
+    except OSError:
+        # Unreadable directory: skip it, as os.walk() does
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_images(entry.path)
+            elif entry.is_file():
+                # Suffix from the last '.'. All-lower and all-upper suffixes
+                # match as-is; only mixed case ('.Jpg') pays for a lower()
+                # copy. Names without a '.' give a 1-char string, which
+                # never matches. (is_file() leaves out directory symlinks.)
+                name = entry.name
+                suffix = name[name.rfind('.'):]
+                if suffix in IMAGE_EXTENSIONS or suffix.lower() in IMAGE_EXTENSIONS:
+                    yield entry.path
 
 # --- Main Function ---
 def main():
+    global _PROCESS_IMAGE
     print("Starting parallel processing...")
+    check_pillow_build()
+
+    start_method = START_METHOD
+    if USE_NUMBA and lanczos_resize is None:
+        print("USE_NUMBA is set but Numba/NumPy are not installed, using Pillow.")
+    elif lanczos_resize is not None:
+        # Compile (or load the cached) kernels before the clock starts.
+        # One thread, like each pool worker, so the 1-worker baseline
+        # really is a single worker.
+        warm_up(TARGET_SIZE, threads=1)
+        print("Using Numba LANCZOS resize.")
+        # Numba's thread pool (now running) doesn't survive a plain fork(),
+        # so start workers from a clean forkserver process instead
+        if start_method == 'fork':
+            start_method = 'forkserver'
+
+    if start_method in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context(start_method)
+    else:
+        ctx = multiprocessing.get_context()
+    print(f"Using '{ctx.get_start_method()}' start method for worker processes.")
+
+    use_opencv = USE_OPENCV
+    if use_opencv and cv2 is None:
+        print("USE_OPENCV is set but OpenCV is not installed, using Pillow.")
+        use_opencv = False
+    if use_opencv:
+        print(f"Using OpenCV {cv2.__version__} pipeline.")
+
+    use_threads = USE_THREADS
+    # The thread sweep calls the Numba kernels from several threads at once,
+    # which needs Numba's 'tbb' or 'omp' threading layer; the fallback
+    # 'workqueue' layer aborts the whole process if used that way.
+    if (use_threads and lanczos_resize is not None and not use_opencv
+            and threading_layer() == 'workqueue'):
+        print("Numba is using the 'workqueue' threading layer, which is not "
+              "thread-safe, skipping the thread sweep (install tbb to enable it).")
+        use_threads = False
     
     # --- 1. Get the list of tasks (all images) ---
     # This part is still sequential, as we need the full list first.
     tasks = [] # This will be a list of (input_path, output_path) tuples
-    for root, _, files in os.walk(SOURCE_DIR):
-        for file in files:
-            if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                input_path = os.path.join(root, file)
-                relative_path = os.path.relpath(input_path, SOURCE_DIR)
-                output_path = os.path.join(OUTPUT_DIR, relative_path)
-                tasks.append((input_path, output_path))
+    for input_path in _iter_images(SOURCE_DIR):
+        relative_path = os.path.relpath(input_path, SOURCE_DIR)
+        output_path = os.path.join(OUTPUT_DIR, relative_path)
+        tasks.append((input_path, output_path))
 
     print(f"Found {len(tasks)} images to process.")
+
+    # Create the output sub-directories once, before any worker starts
+    unique_dirs = {os.path.dirname(output_path) for _, output_path in tasks}
+    for d in unique_dirs:
+        os.makedirs(d, exist_ok=True)
     
     # --- 2. Run Sequential (1 Worker) to get baseline ---
     # We can't import from sequential_process.py easily,
     # so we just run the 1-worker version here as our baseline.
+    # (The thread sweep below reuses the same processor.)
+    _PROCESS_IMAGE = make_processor(TARGET_SIZE, RESAMPLE, _get_watermark())
     print("\nRunning with 1 worker (Baseline)...")
     start_seq = time.perf_counter()
     
     # map() applies the function to each item in the 'tasks' list
     # We use a list comprehension to force it to execute now.
-    results_seq = [process_image(task) for task in tasks]
+    if use_opencv:
+        results_seq = opencv_process_batch(tasks)
+    else:
+        results_seq = [process_image(task) for task in tasks]
     
     end_seq = time.perf_counter()
     baseline_time = end_seq - start_seq
@@ -96,51 +344,103 @@ def main():
     # Add baseline to our table [cite: 37, 38]
     results_table.append((1, baseline_time, 1.0))
 
-    # --- Option A: Using multiprocessing.Pool (Recommended)  ---
-    print("\n--- Testing with multiprocessing.Pool ---")
-    for count in worker_counts:
-        print(f"Running with {count} processes...")
-        start_time = time.perf_counter()
-
-        # Create a process pool with 'count' number of workers
-        with multiprocessing.Pool(processes=count) as pool:
-            # pool.map distributes the 'tasks' list among the workers
-            #
-            # It takes the 'process_image' function and one item from
-            # the 'tasks' list at a time and gives it to a free worker.
-            # It blocks until all tasks are complete.
-            results = pool.map(process_image, tasks)
-
-        end_time = time.perf_counter()
-        total_time = end_time - start_time
-        
-        # Calculate speedup
-        speedup = baseline_time / total_time
-        results_table.append((count, total_time, speedup))
-        print(f"{count} Processes Time: {total_time:.2f} s (Speedup: {speedup:.2f}x)")
-
-    # --- Option B: Using ThreadPoolExecutor (Alternative)  ---
-    # Note: For this CPU-bound task, threads are slower than processes
-    # due to Python's Global Interpreter Lock (GIL). But the exam
-    # allows it, so you could use this code instead.
-    
-    # print("\n--- Testing with ThreadPoolExecutor ---")
-    # for count in worker_counts:
-    #     print(f"Running with {count} threads...")
-    #     start_time = time.perf_counter()
+    # Shared by every pool below (see _share_watermark)
+    watermark_shm, watermark_size = _share_watermark()
+    try:
+        # --- Option A: Using multiprocessing.Pool (Recommended)  ---
+        print("\n--- Testing with multiprocessing.Pool ---")
+        if len(tasks) <= 1:
+            # Nothing to split, so don't time pools that would sit idle
+            print(f"Only {len(tasks)} image(s) to process, skipping the 2/4/8 worker sweep.")
+            worker_counts = []
+        for count in worker_counts:
+            print(f"Running with {count} processes...")
+
+            # Hand out tasks in batches (~4 per worker) so each IPC
+            # round-trip carries many images instead of just one.
+            chunksize = max(1, len(tasks) // (count * 4))
 
-    #     with ThreadPoolExecutor(max_workers=count) as executor:
-    #         # executor.map works just like pool.map
-    #         results = list(executor.map(process_image, tasks))
+            # Create a process pool with 'count' number of workers.
+            # The initializer loads PIL's plugins and the watermark in each worker.
+            # 'count' workers + the master
+            ready = ctx.Barrier(count + 1)
+            pool_start_time = time.perf_counter()
+            with ctx.Pool(processes=count, initializer=_init_worker,
+                          initargs=(watermark_shm.name, watermark_size, ready)) as pool:
+                # Wait until every worker has run _init_worker before we start
+                # the clock. That way the table shows the parallel throughput,
+                # not process start-up.
+                ready.wait()
+                start_time = time.perf_counter()
+                print(f"  (pool start-up took {start_time - pool_start_time:.2f} s)")
 
-    #     end_time = time.perf_counter()
-    #     total_time = end_time - start_time
+                # imap_unordered yields each result as soon as its chunk is
+                # done, in whatever order the workers finish. We wrap it in
+                # list() so it blocks until all tasks are complete.
+                if use_opencv:
+                    # Same batching, but each batch is one call so the
+                    # worker can reuse its output buffer across images
+                    batches = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+                    results = [r for batch_results in pool.imap_unordered(opencv_process_batch, batches)
+                               for r in batch_results]
+                else:
+                    results = list(pool.imap_unordered(process_image, tasks, chunksize=chunksize))
+                end_time = time.perf_counter()
+
+                # Let the workers exit on their own rather than being
+                # terminated by the with-block (Numba's threads in a killed
+                # worker leave its semaphores behind)
+                pool.close()
+                pool.join()
+
+            total_time = end_time - start_time
         
-    #     speedup = baseline_time / total_time
-    #     # Add to table if not already there
-    #     # results_table.append((count, total_time, speedup)) 
-    #     print(f"{count} Threads Time: {total_time:.2f} s (Speedup: {speedup:.2f}x)")
+            # Calculate speedup
+            speedup = baseline_time / total_time
+            results_table.append((count, total_time, speedup))
+            print(f"{count} Processes Time: {total_time:.2f} s (Speedup: {speedup:.2f}x)")
+
+        # --- Option B: Using ThreadPoolExecutor (Alternative)  ---
+        # The heavy parts of process_image() - JPEG decode, the LANCZOS
+        # resize and JPEG encode - run in Pillow's C code, which releases the
+        # GIL (as do OpenCV and the Numba kernels). So threads can run them in
+        # parallel too, without any process start-up or pickling of tasks and
+        # results. Enable with USE_THREADS=1 to compare against the processes.
+        # (Skipped with USE_NUMBA=1 on the 'workqueue' threading layer, see above.)
+        thread_results_table = []
+        if use_threads:
+            print("\n--- Testing with ThreadPoolExecutor ---")
+            # Numba's thread cap is per calling thread, so the master's
+            # warm_up() doesn't cover the executor's threads. Cap each one
+            # at a single kernel thread, like the pool workers.
+            thread_init, thread_initargs = None, ()
+            if lanczos_resize is not None and not use_opencv:
+                thread_init, thread_initargs = set_num_threads, (1,)
+            for count in worker_counts:
+                print(f"Running with {count} threads...")
+                start_time = time.perf_counter()
 
+                with ThreadPoolExecutor(max_workers=count, initializer=thread_init,
+                                        initargs=thread_initargs) as executor:
+                    # executor.map works just like pool.map
+                    if use_opencv:
+                        chunksize = max(1, len(tasks) // (count * 4))
+                        batches = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+                        results = [r for batch_results in executor.map(opencv_process_batch, batches)
+                                   for r in batch_results]
+                    else:
+                        results = list(executor.map(process_image, tasks))
+
+                end_time = time.perf_counter()
+                total_time = end_time - start_time
+            
+                speedup = baseline_time / total_time
+                thread_results_table.append((count, total_time, speedup))
+                print(f"{count} Threads Time: {total_time:.2f} s (Speedup: {speedup:.2f}x)")
+    finally:
+        # Free the shared block even if a run fails or is interrupted
+        watermark_shm.close()
+        watermark_shm.unlink()
 
     # --- 4. Display the speedup table ---
     # [cite: 34, 35]
@@ -153,6 +453,13 @@ def main():
         print(f"{workers:<8} | {time_s:<10.2f} | {speedup:<8.2f}x")
     print("="*30)
 
+    if thread_results_table:
+        print(f"{'Threads':<8} | {'Time (s)':<10} | {'Speedup':<8}")
+        print("-" * 30)
+        for threads, time_s, speedup in thread_results_table:
+            print(f"{threads:<8} | {time_s:<10.2f} | {speedup:<8.2f}x")
+        print("="*30)
+
 
 # This "if __name__ == '__main__':" block is ESSENTIAL for multiprocessing.
 # It prevents child processes from re-running the main script when
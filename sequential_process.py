@@ -1,8 +1,11 @@
 # [File: sequential_process.py]
 # [cite: 22]
 
+import io
 import os
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
 
 # --- Configuration ---
@@ -11,76 +14,234 @@ SOURCE_DIR = os.path.join(SCRIPT_DIR, 'images_dataset')
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'output_seq')         # Folder for processed images [cite: 26]
 TARGET_SIZE = (128, 128)            # Target resize dimensions 
 WATERMARK_TEXT = "CUI-LHR SP23"     # Watermark text 
+RESAMPLE = Image.LANCZOS            # Resize filter (BICUBIC/BILINEAR are faster, lower quality)
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.PNG', '.JPG', '.JPEG', '.BMP'})  # Files to process
+PREFETCH_DEPTH = 16                 # Images read ahead of the one being processed
+IO_THREADS = 4                      # Threads doing the read-ahead
+
+# Optional Numba LANCZOS kernel (see lanczos_resize.py), enabled with USE_NUMBA=1
+USE_NUMBA = os.environ.get('USE_NUMBA', '0') == '1'
+lanczos_resize = None
+if USE_NUMBA:
+    try:
+        from lanczos_resize import lanczos_resize, warm_up
+    except ImportError:
+        pass
+
+# Encoder settings by output extension. Spelled out so the fast path is
+# used regardless of Pillow version: baseline 4:2:0 JPEG at quality 70
+# (Pillow's default is 75) with no optimize/progressive passes, and the
+# fastest zlib level for PNG (Pillow's default is 6).
+JPEG_SAVE_OPTIONS = {'format': 'JPEG', 'quality': 70, 'optimize': False,
+                     'subsampling': 2, 'progressive': False}
+SAVE_OPTIONS = {
+    '.jpg': JPEG_SAVE_OPTIONS,
+    '.jpeg': JPEG_SAVE_OPTIONS,
+    '.png': {'format': 'PNG', 'compress_level': 1},
+}
+
+# --- Check which Pillow build is installed ---
+def check_pillow_build():
+    """
+    Prints whether Pillow-SIMD is in use. Pillow-SIMD versions carry a
+    '.postN' suffix (e.g. '9.0.0.post1'); its LANCZOS resize is SSE4/AVX2
+    accelerated, which is the biggest single cost in process_image().
+    """
+    if '.post' in Image.__version__:
+        print(f"Using Pillow-SIMD {Image.__version__} (SIMD-accelerated resize)")
+    else:
+        print(f"Using stock Pillow {Image.__version__} (install pillow-simd for faster resize)")
+
+# --- Load the watermark font once ---
+_FONT = None
+
+def _get_font():
+    """
+    Returns the watermark font, loading it on the first call only.
+    Previously every image re-probed the filesystem for arial.ttf.
+    """
+    global _FONT
+    if _FONT is None:
+        # Try to load a font, fall back to default if not found
+        try:
+            # You might need to change this path to a font file on your system
+            _FONT = ImageFont.truetype("arial.ttf", 10)
+        except IOError:
+            # print("Arial font not found, using default font.")
+            _FONT = ImageFont.load_default()
+    return _FONT
+
+# --- Pre-render the watermark once ---
+_WATERMARK_MASK = None
+
+def _get_watermark():
+    """
+    Returns the watermark text rendered once into a grayscale mask.
+    The text is the same for every image, so instead of laying out and
+    rasterizing it per image we just paste white through this mask.
+    """
+    global _WATERMARK_MASK
+    if _WATERMARK_MASK is None:
+        font = _get_font()
+        _, _, right, bottom = font.getbbox(WATERMARK_TEXT)
+        _WATERMARK_MASK = Image.new('L', (right, bottom), 0)
+        ImageDraw.Draw(_WATERMARK_MASK).text((0, 0), WATERMARK_TEXT, font=font, fill=255)
+    return _WATERMARK_MASK
 
 # --- Helper Function to Process a Single Image ---
-def process_image(input_path, output_path):
+def make_processor(size, resample, watermark_mask):
     """
-    Reads an image, resizes it, adds a watermark, and saves it.
+    Builds process_image() for one fixed target size, filter and watermark.
+    Everything the per-image code needs is worked out once here and read
+    from the closure, rather than looked up as module globals on every call.
     """
-    try:
-        # 1. Read the image [cite: 23]
-        with Image.open(input_path) as img:
-            # 2. Resize the image 
-            img = img.resize(TARGET_SIZE, Image.LANCZOS)
-
-            # 3. Add watermark 
-            # Ensure image is in RGB mode to add a color watermark
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
+    width, height = size
+    draft_size = (width * 2, height * 2)
+    text_position = (5, height - 15) # 5px from left, 15px from bottom
+    text_color = (255, 255, 255) # White
+    save_options = SAVE_OPTIONS
+    default_options = {}
+    splitext = os.path.splitext
+    resize = lanczos_resize
+    open_image = Image.open
+    bytes_io = io.BytesIO
+
+    def process_image(input_path, output_path, data=None):
+        """
+        Reads an image, resizes it, adds a watermark, and saves it.
+        If 'data' holds the file's bytes (already read ahead), it is decoded
+        from memory instead of reading input_path again.
+        """
+        try:
+            # 1. Read the image [cite: 23]
+            source = bytes_io(data) if data is not None else input_path
+            with open_image(source) as img:
+                # 2. Resize the image 
+                # draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale, so LANCZOS
+                # works on far fewer pixels. It is a no-op for non-JPEG files.
+                img.draft('RGB', draft_size)
+                # Palette, 1-bit, CMYK and alpha images are converted to RGB
+                # *before* resizing: Pillow can only resize '1'/'P' images
+                # with NEAREST, and CMYK would be filtered in the wrong space.
+                # RGB and grayscale ('L') images are resized as they are.
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                if resize is not None:
+                    img = resize(img, size)
+                else:
+                    img = img.resize(size, resample)
+
+                # 3. Add watermark 
+                # Ensure image is in RGB mode to add a color watermark
+                # (only grayscale images still need converting here)
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+
+                # Paste the pre-rendered text (see _get_watermark)
+                img.paste(text_color, text_position, watermark_mask)
+
+                # 4. Save the processed image
+                # (main() has already created the output directory)
+                img.save(output_path, **save_options.get(splitext(output_path)[1].lower(), default_options))
                 
-            draw = ImageDraw.Draw(img)
-            
-            # Try to load a font, fall back to default if not found
-            try:
-                # You might need to change this path to a font file on your system
-                font = ImageFont.truetype("arial.ttf", 10)
-            except IOError:
-                # print("Arial font not found, using default font.")
-                font = ImageFont.load_default()
-
-            # Position the text at the bottom-left
-            text_position = (5, TARGET_SIZE[1] - 15) # 5px from left, 15px from bottom
-            text_color = (255, 255, 255) # White
-            
-            draw.text(text_position, WATERMARK_TEXT, font=font, fill=text_color)
-
-            # 4. Save the processed image
-            # Ensure the output directory for this image's class exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            img.save(output_path)
-            
-    except Exception as e:
-        print(f"Error processing {input_path}: {e}")
+        except Exception as e:
+            print(f"Error processing {input_path}: {e}")
+
+    return process_image
+
+process_image = make_processor(TARGET_SIZE, RESAMPLE, _get_watermark())
+
+# --- Read-ahead Helper ---
+def _read_file(path):
+    """
+    Returns the raw bytes of a file, or None if it can't be read
+    (process_image() then retries from the path and reports the error).
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+# --- Find All Images ---
+def _iter_images(root):
+    """
+    Yields the path of every image file under 'root', recursively.
+    os.scandir() returns each entry's name, path and type together, so
+    there is no extra os.path.join() or stat() per file (as with os.walk).
+    """
+    try:
+        entries = os.scandir(root)
+    except OSError:
+        # Unreadable directory: skip it, as os.walk() does
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_images(entry.path)
+            elif entry.is_file():
+                # Suffix from the last '.'. All-lower and all-upper suffixes
+                # match as-is; only mixed case ('.Jpg') pays for a lower()
+                # copy. Names without a '.' give a 1-char string, which
+                # never matches. (is_file() leaves out directory symlinks.)
+                name = entry.name
+                suffix = name[name.rfind('.'):]
+                if suffix in IMAGE_EXTENSIONS or suffix.lower() in IMAGE_EXTENSIONS:
+                    yield entry.path
 
 # --- Main Sequential Execution ---
 def main():
     print("Starting sequential processing...")
+    check_pillow_build()
+
+    if USE_NUMBA and lanczos_resize is None:
+        print("USE_NUMBA is set but Numba/NumPy are not installed, using Pillow.")
+    elif lanczos_resize is not None:
+        # Compile (or load the cached) kernels before the clock starts.
+        # One thread, so the baseline stays single-threaded.
+        warm_up(TARGET_SIZE, threads=1)
+        print("Using Numba LANCZOS resize.")
     
     # Get the absolute start time
     total_start_time = time.perf_counter()
 
     image_files = []
-    # os.walk() recursively finds all files in all subdirectories
-    for root, _, files in os.walk(SOURCE_DIR):
-        for file in files:
-            # Simple check for common image file extensions
-            if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                
-                # Construct the full path to the source image
-                input_path = os.path.join(root, file)
-                
-                # Construct the corresponding output path, preserving the subfolder structure
-                # os.path.relpath gets the "relative" part (e.g., 'cats/cat1.jpg')
-                relative_path = os.path.relpath(input_path, SOURCE_DIR)
-                output_path = os.path.join(OUTPUT_DIR, relative_path)
-                
-                image_files.append((input_path, output_path))
+    # _iter_images() recursively finds all image files in all subdirectories
+    for input_path in _iter_images(SOURCE_DIR):
+        # Construct the corresponding output path, preserving the subfolder structure
+        # os.path.relpath gets the "relative" part (e.g., 'cats/cat1.jpg')
+        relative_path = os.path.relpath(input_path, SOURCE_DIR)
+        output_path = os.path.join(OUTPUT_DIR, relative_path)
+        
+        image_files.append((input_path, output_path))
 
     print(f"Found {len(image_files)} images to process.")
 
-    # Loop through all found image paths and process them one by one
-    for input_path, output_path in image_files:
-        process_image(input_path, output_path)
+    # Create each class's output directory once, instead of once per image
+    unique_dirs = {os.path.dirname(output_path) for _, output_path in image_files}
+    for d in unique_dirs:
+        os.makedirs(d, exist_ok=True)
+
+    # Loop through all found image paths and process them one by one.
+    # The processing is still sequential, but a few I/O threads read the
+    # next PREFETCH_DEPTH files from disk while this thread decodes and
+    # resizes the current one, so disk reads overlap with compute.
+    with ThreadPoolExecutor(max_workers=IO_THREADS) as io_pool:
+        remaining = iter(image_files)
+        pending = deque()
+
+        def read_ahead():
+            next_task = next(remaining, None)
+            if next_task is not None:
+                pending.append((next_task, io_pool.submit(_read_file, next_task[0])))
+
+        for _ in range(PREFETCH_DEPTH):
+            read_ahead()
+
+        while pending:
+            (input_path, output_path), future = pending.popleft()
+            read_ahead()
+            process_image(input_path, output_path, future.result())
 
     # Get the absolute end time and print the total
     total_end_time = time.perf_counter()